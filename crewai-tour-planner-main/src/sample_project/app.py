@@ -3,12 +3,27 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import streamlit as st
-import requests
 import os
+import uuid
+
+# Import our modules through the sample_project package, as main.py does, so that the
+# process-wide upstream client and LLM scheduler exist once even when both are loaded.
+# Streamlit re-runs this on every interaction, so only add the path once.
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
 from dotenv import load_dotenv
 from crewai import Task, Crew
-from crew import TourPlanningProject
-import content_validator as Validator
+from sample_project.crew import TourPlanningProject
+from sample_project import content_validator as Validator
+from sample_project.upstream_client import upstream, CircuitOpenError
+from sample_project import route_planner
+from sample_project import plan_store
+from sample_project import llm_scheduler
+from sample_project.llm_scheduler import scheduler, llm_context, QueueTimeoutError
+
+llm_scheduler.install()
 
 # Load environment variables
 load_dotenv()
@@ -17,16 +32,19 @@ WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")  # Store WeatherAPI Key in .env
 
 # Function to fetch current weather
 def get_current_weather(city):
-    url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={city}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        return {
+    return upstream.get_json(
+        "http://api.weatherapi.com/v1/current.json",
+        params={"key": WEATHER_API_KEY, "q": city},
+        parse=lambda data: {
             "temperature": data["current"]["temp_c"],
             "condition": data["current"]["condition"]["text"],
             "icon": data["current"]["condition"]["icon"]
-        }
-    return None
+        },
+        fallback=lambda: get_mock_weather(city)
+    )
+
+# Mock scenario used per season when the real API is unavailable
+SEASON_MOCK_SCENARIOS = {"Spring": "sunny_day", "Summer": "sunny_day", "Fall": "rainy_day", "Winter": "snowy_day"}
 
 # Function to fetch seasonal weather
 def get_seasonal_weather(city, season):
@@ -34,17 +52,16 @@ def get_seasonal_weather(city, season):
     if season not in season_months:
         return None
 
-    url = f"http://api.weatherapi.com/v1/history.json?key={WEATHER_API_KEY}&q={city}&dt={season_months[season]}"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        return {
+    return upstream.get_json(
+        "http://api.weatherapi.com/v1/history.json",
+        params={"key": WEATHER_API_KEY, "q": city, "dt": season_months[season]},
+        parse=lambda data: {
             "temperature": data["forecast"]["forecastday"][0]["day"]["avgtemp_c"],
             "condition": data["forecast"]["forecastday"][0]["day"]["condition"]["text"],
             "icon": data["forecast"]["forecastday"][0]["day"]["condition"]["icon"]
-        }
-    return None
+        },
+        fallback=lambda: get_mock_weather(city, SEASON_MOCK_SCENARIOS[season])
+    )
 
 # Function to fetch mock weather
 def get_mock_weather(city, scenario="sunny_day"):
@@ -72,6 +89,67 @@ def get_mock_weather(city, scenario="sunny_day"):
     }
     return mock_weather_data.get(scenario.lower().replace(' ', '_'))
 
+# Current, mock and seasonal weather for one city
+def fetch_city_weather(city, scenario=None):
+    if scenario:
+        current_weather = get_mock_weather(city, scenario)
+        return {
+            "current": current_weather,
+            "mock": current_weather,
+            # Use mock data for seasonal weather
+            "seasonal": {season: get_mock_weather(city, s) for season, s in SEASON_MOCK_SCENARIOS.items()}
+        }
+
+    seasons = list(SEASON_MOCK_SCENARIOS)
+    current_weather, *seasonal = route_planner.run_parallel(
+        lambda season: get_current_weather(city) if season is None else get_seasonal_weather(city, season),
+        [None] + seasons
+    )
+    return {"current": current_weather, "mock": None, "seasonal": dict(zip(seasons, seasonal))}
+
+# Task description for one leg of the trip
+def build_trip_details(leg, budget, interests, weather):
+    current_weather = weather["current"] or {}
+    seasonal_weather = "\n".join(
+        f"{season}: Temperature: {w['temperature']}°C, Condition: {w['condition']}"
+        for season, w in weather["seasonal"].items() if w
+    )
+    return f"""
+        Plan a trip to {leg['city']} for {leg['days']} days starting {leg['start_date']}.
+        Budget: ${budget}
+        Interests: {', '.join(interests)}
+
+        Weather Information:
+        Current Weather: Temperature: {current_weather.get('temperature', 'N/A')}°C, Condition: {current_weather.get('condition', 'N/A')}
+        Seasonal Weather:
+        {seasonal_weather}
+
+        Please consider the current and seasonal weather conditions when planning activities.
+        Suggest indoor alternatives for bad weather and outdoor activities for good weather.
+        Make appropriate recommendations based on the temperature and conditions.
+        """
+
+# Runs on a worker thread, so no Streamlit calls in here
+def generate_leg_plan(details, agent, base_plan=None, session="default", tenant="default"):
+    if base_plan:
+        # Pre-generated plan for a similar trip - only personalise what differs
+        details += f"""
+        Start from the base itinerary below, which was prepared for a similar trip.
+        Keep what still fits and only adjust what differs: exact dates, number of days, budget, interests and weather.
+
+        Base itinerary:
+        {base_plan}
+        """
+    task = Task(
+        description=details,
+        expected_output="A detailed travel plan including weather-appropriate recommendations based on the provided preferences, budget, and current/seasonal weather conditions.",
+        agent=agent
+    )
+    crew = Crew(agents=[agent], tasks=[task], verbose=True)
+    with llm_context(session, tenant, llm_scheduler.PLAN):
+        result = upstream.call("llm", crew.kickoff, retries=1)
+    return getattr(result, "raw", "❌ No trip plan generated. Please try again.")
+
 # Streamlit UI
 def main():
     st.set_page_config(page_title="AI Tour Planner", page_icon="🌍", layout="wide")
@@ -136,8 +214,19 @@ def main():
 
     if "prev_user_message" not in st.session_state:
         st.session_state.prev_user_message = ""
+
+    # Identify the session and tenant for LLM rate limiting
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = str(uuid.uuid4())
+        st.session_state.tenant = st.query_params.get("tenant", "default")
     
 
+    with st.sidebar.expander("Upstream health"):
+        st.json(upstream.metrics())
+
+    with st.sidebar.expander("LLM queue"):
+        st.json(scheduler.metrics())
+
     tab1, tab2 = st.tabs(["Chat", "Plan"])
     with tab1:
         chat_trip()
@@ -148,6 +237,11 @@ def chat_trip():
     st.header("Conversation")
 
     chatConversations()
+    # Once a plan is generated its conversation input lives on the Plan tab - rendering it
+    # here as well would create a second "user_input_plan"/"submit_plan" widget
+    if st.session_state.window_type == "Plan":
+        st.info("Continue the conversation about your trip plan in the Plan tab.")
+        return
     userChatArea()
     submitBtn()
 
@@ -168,7 +262,7 @@ def plan_trip():
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        destination = st.text_input("📍 Destination")
+        destination = st.text_input("📍 Destination", help="Separate multiple cities with commas, e.g. Madurai, Trichy")
     with col2:
         start_date = st.date_input("📆 Start Date")
     with col3:
@@ -187,124 +281,70 @@ def plan_trip():
     # Modify the weather fetching section
     generate_btn = st.button("🚀 Generate Trip Plan", key="generate")
     if generate_btn:
-        if destination:
+        if route_planner.parse_destinations(destination):
             st.session_state.window_type = "Plan"
             st.session_state.window_selected = "Plan"
             st.session_state.pre_chat_history = []
             with st.spinner('🔄 Fetching weather data and generating your trip plan...'):
                 try:
-                    # Fetch Weather Data based on API selection
-                    if use_mock_api:
-                        scenario = mock_api_option.lower().replace(' ', '_')
-                        current_weather = get_mock_weather(destination, scenario)
-                        st.session_state["real_weather"] = current_weather
-                        st.session_state["mock_weather"] = current_weather
-                        
-                        # Use mock data for seasonal weather
-                        st.session_state["seasonal_weather"] = {
-                            "Spring": get_mock_weather(destination, "sunny_day"),
-                            "Summer": get_mock_weather(destination, "sunny_day"),
-                            "Fall": get_mock_weather(destination, "rainy_day"),
-                            "Winter": get_mock_weather(destination, "snowy_day")
-                        }
-                    else:
-                        current_weather = get_current_weather(destination)
-                        st.session_state["real_weather"] = current_weather
-                        st.session_state["mock_weather"] = None
-                        
-                        # Fetch real seasonal weather data
-                        st.session_state["seasonal_weather"] = {
-                            season: get_seasonal_weather(destination, season) 
-                            for season in ["Spring", "Summer", "Fall", "Winter"]
-                        }
+                    scenario = mock_api_option.lower().replace(' ', '_') if use_mock_api else None
+                    cities = route_planner.order_route(route_planner.parse_destinations(destination))
+                    legs = route_planner.split_days(cities, duration, start_date, budget)
+
+                    # Fetch Weather Data for every city at the same time
+                    st.session_state["trip_weather"] = dict(zip(cities, route_planner.run_parallel(
+                        lambda city: fetch_city_weather(city, scenario), cities
+                    )))
 
                     # Display Weather Data First
                     st.markdown("## 🌦 Weather Information")
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        weather = st.session_state["real_weather"]
-                        if weather:
-                            st.markdown(f"### 🌍 Current Weather in {destination} (Real API)")
-                            st.image(f"http:{weather['icon']}", width=80)
-                            st.write(f"**Temperature:** {weather['temperature']}°C")
-                            st.write(f"**Condition:** {weather['condition']}")
-
-                    with col2:
-                        mock_weather = st.session_state["mock_weather"]
-                        if mock_weather:
-                            st.markdown(f"### 🏷 Today's Weather in {destination} (Mock API)")
-                            st.write(f"🌤 **{mock_weather['icon']} {mock_weather['condition']}**")
-                            st.write(f"**Temperature:** {mock_weather['temperature']}°C")
-
-                    # Seasonal Weather Display (Side-by-Side Flex Layout)
-                    if st.session_state["seasonal_weather"]:
-                        st.markdown("### 📅 Seasonal Weather")
-
-                        # Create four columns for Spring, Summer, Fall, and Winter
-                        col1, col2, col3, col4 = st.columns(4)
-
-                        seasons = ["Spring", "Summer", "Fall", "Winter"]
-                        cols = [col1, col2, col3, col4]
-
-                        for season, col in zip(seasons, cols):
-                            season_weather = st.session_state["seasonal_weather"].get(season)
-                            if season_weather:
-                                with col:
-                                    st.markdown(f"#### {season}")
-                                    st.image(f"http:{season_weather['icon']}", width=80)
-                                    st.write(f"**Avg Temp:** {season_weather['temperature']}°C")
-                                    st.write(f"**Condition:** {season_weather['condition']}")
-                            else:
-                                with col:
-                                    st.warning(f"{season} data unavailable.")
+                    if len(legs) > 1:
+                        st.write("**Route:** " + " → ".join(cities))
+                    for city in cities:
+                        showWeather(city, st.session_state["trip_weather"][city])
 
                     # Trip Planning
                     st.markdown("---")
                     st.markdown("## 🗺 Your Travel Itinerary")
 
                     # Initialize the crew
-                    weather_info = f"""
-                        Current Weather: Temperature: {current_weather.get('temperature', 'N/A')}°C, Condition: {current_weather.get('condition', 'N/A')}
-                        """
-                    
                     initializeAgent()
-                    
-                    st.session_state.initial_details = f"""
-                        Plan a trip to {destination} for {duration} days starting {start_date}.
-                        Budget: ${budget}
-                        Interests: {', '.join(interests)}
-                        
-                        Weather Information:
-                        Current Weather: {weather_info}
-                        Seasonal Weather:
-                        Spring: Temperature: {st.session_state['seasonal_weather']['Spring']['temperature']}°C, Condition: {st.session_state['seasonal_weather']['Spring']['condition']}
-                        Summer: Temperature: {st.session_state['seasonal_weather']['Summer']['temperature']}°C, Condition: {st.session_state['seasonal_weather']['Summer']['condition']}
-                        Fall: Temperature: {st.session_state['seasonal_weather']['Fall']['temperature']}°C, Condition: {st.session_state['seasonal_weather']['Fall']['condition']}
-                        Winter: Temperature: {st.session_state['seasonal_weather']['Winter']['temperature']}°C, Condition: {st.session_state['seasonal_weather']['Winter']['condition']}
-                        
-                        Please consider the current and seasonal weather conditions when planning activities. 
-                        Suggest indoor alternatives for bad weather and outdoor activities for good weather.
-                        Make appropriate recommendations based on the temperature and conditions.
-                        """
-                    
-                    task = Task(
-                        description=st.session_state.initial_details,
-                        expected_output="A detailed travel plan including weather-appropriate recommendations based on the provided preferences, budget, and current/seasonal weather conditions.",
-                        agent=st.session_state.agent
+
+                    leg_details = [
+                        build_trip_details(leg, leg["budget"], interests, st.session_state["trip_weather"][leg["city"]])
+                        for leg in legs
+                    ]
+                    st.session_state.initial_details = "\n".join(leg_details)
+                    if len(legs) > 1:
+                        st.session_state.initial_details = f"""
+                        Multi-city trip: {' → '.join(cities)}, {duration} days starting {start_date}, total budget ${budget}.
+                        """ + st.session_state.initial_details
+
+                    # Show any pre-generated base plans straight away while they are personalised
+                    base_plans = [plan_store.lookup_plan(leg["city"], leg["days"], leg["budget"], interests) for leg in legs]
+                    for leg, base_plan in zip(legs, base_plans):
+                        if base_plan:
+                            with st.expander(f"⚡ Base plan for {leg['city']} (personalising...)"):
+                                st.markdown(base_plan)
+
+                    # One crew per city, all generated in parallel
+                    agents = [st.session_state.agent] + [TourPlanningProject().tour_planner() for _ in legs[1:]]
+                    session_id, tenant = st.session_state.session_id, st.session_state.tenant
+                    plans = route_planner.run_parallel(
+                        lambda args: generate_leg_plan(*args, session=session_id, tenant=tenant),
+                        list(zip(leg_details, agents, base_plans))
                     )
+                    trip_plan = plans[0] if len(legs) == 1 else route_planner.merge_plans(legs, plans)
 
-                    # Get the crew and run
+                    # Keep a crew around for follow-up chat
                     st.session_state.crew = Crew(
                         agents=[st.session_state.agent],
-                        tasks=[task],
+                        tasks=[],
                         verbose=True
                     )
-                    result = st.session_state.crew.kickoff()
 
                     st.session_state.initial_response_fetched = True
                     st.success("🎉 Trip Plan Generated!")
-                    trip_plan = getattr(result, "raw", "❌ No trip plan generated. Please try again.")
                     st.markdown("")
 
                     st.session_state.chat_history.append(("AI", trip_plan))
@@ -322,6 +362,50 @@ def plan_trip():
         userChatArea()
         submitBtn()
 
+def showWeather(destination, weather):
+    col1, col2 = st.columns(2)
+
+    with col1:
+        current_weather = weather["current"]
+        if current_weather:
+            st.markdown(f"### 🌍 Current Weather in {destination} (Real API)")
+            st.image(f"http:{current_weather['icon']}", width=80)
+            st.write(f"**Temperature:** {current_weather['temperature']}°C")
+            st.write(f"**Condition:** {current_weather['condition']}")
+            if current_weather.get("degraded"):
+                st.caption("⚠️ Live weather unavailable, showing cached or estimated data.")
+
+    with col2:
+        mock_weather = weather["mock"]
+        if mock_weather:
+            st.markdown(f"### 🏷 Today's Weather in {destination} (Mock API)")
+            st.write(f"🌤 **{mock_weather['icon']} {mock_weather['condition']}**")
+            st.write(f"**Temperature:** {mock_weather['temperature']}°C")
+
+    # Seasonal Weather Display (Side-by-Side Flex Layout)
+    if weather["seasonal"]:
+        st.markdown("### 📅 Seasonal Weather")
+
+        # Create four columns for Spring, Summer, Fall, and Winter
+        col1, col2, col3, col4 = st.columns(4)
+
+        seasons = ["Spring", "Summer", "Fall", "Winter"]
+        cols = [col1, col2, col3, col4]
+
+        for season, col in zip(seasons, cols):
+            season_weather = weather["seasonal"].get(season)
+            if season_weather:
+                with col:
+                    st.markdown(f"#### {season}")
+                    st.image(f"http:{season_weather['icon']}", width=80)
+                    st.write(f"**Avg Temp:** {season_weather['temperature']}°C")
+                    st.write(f"**Condition:** {season_weather['condition']}")
+                    if season_weather.get("degraded"):
+                        st.caption("⚠️ Estimated")
+            else:
+                with col:
+                    st.warning(f"{season} data unavailable.")
+
 def chatConversations():
     for chat_history in [st.session_state.pre_chat_history, st.session_state.chat_history]:
         for role, message in chat_history:
@@ -429,7 +513,11 @@ def submitBtn():
                     st.session_state.crew.tasks = [follow_up_task]
 
                     # Run CrewAI with the new task
-                    response = st.session_state.crew.kickoff()
+                    try:
+                        with llm_context(st.session_state.session_id, st.session_state.tenant, llm_scheduler.INTERACTIVE):
+                            response = upstream.call("llm", st.session_state.crew.kickoff, retries=1)
+                    except (CircuitOpenError, QueueTimeoutError) as e:
+                        response = f"⚠️ {e}"
 
                     st.session_state.chat_history.append(("AI", response))
                     st.session_state.loading = False
@@ -447,7 +535,16 @@ def parseChatRequestAndProceed(user_message):
             [f"{role}: {message}" for role, message in st.session_state.pre_chat_history]
         )
         conversation_context += "\n" + "User: " + user_message
-        parsedContent = Validator.parseContent(conversation_context)
+        try:
+            parsedContent = Validator.parseContent(
+                conversation_context, session=st.session_state.session_id, tenant=st.session_state.tenant
+            )
+        except (CircuitOpenError, QueueTimeoutError) as e:
+            st.session_state.pre_chat_history.append(("User", user_message))
+            st.session_state.pre_chat_history.append(("AI", f"⚠️ {e}"))
+            st.session_state.loading = False
+            st.session_state.user_response_fetched = True
+            st.rerun()
 
         follow_up_question = []
 
@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 from crewai import Task, Crew, Agent
 from crewai.project import CrewBase, agent, task
 import json
+from sample_project.upstream_client import upstream
+from sample_project.llm_scheduler import llm_context, INTERACTIVE
 from datetime import datetime
 
 # Load environment variables
@@ -26,7 +28,7 @@ class ValidatorAgent():
 
 validator_agent = ValidatorAgent().validator()
 
-def parseContent(context):
+def parseContent(context, session="default", tenant="default"):
   # current_date = datetime.today().strftime("%d-%b-%Y")
   current_task = Task(
       description=context,
@@ -45,7 +47,8 @@ def parseContent(context):
   )
 
   crew.tasks = [current_task]
-  response = crew.kickoff()
+  with llm_context(session, tenant, INTERACTIVE):
+    response = upstream.call("llm", crew.kickoff, retries=1)
   response = str(response)
   response = response.strip("`").strip("json").strip()
   response = json.loads(response)
@@ -0,0 +1,340 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Priority classes - lower runs first
+INTERACTIVE = 0
+PLAN = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PLAN: "plan", BATCH: "batch"}
+
+# Largest number of LLM requests one session starts at once: one per leg of a
+# multi-city plan, and plan_trip allows up to 30 days (so up to 30 legs)
+MAX_FAN_OUT = 30
+
+class _Kickoff():
+    """One llm_context block: who is asking, and how long its requests have queued so far."""
+
+    def __init__(self, session, tenant, priority):
+        self.session = session
+        self.tenant = tenant
+        self.priority = priority
+        self.queued = 0.0
+
+
+# Who is asking, set by callers around a kickoff and read by every LLM request it makes
+_caller = contextvars.ContextVar("llm_caller", default=None)
+
+
+@contextmanager
+def llm_context(session="default", tenant="default", priority=PLAN):
+    """
+    Attribute the LLM requests made inside the block (in this thread) to a session, tenant and
+    priority. They share one max queue wait, so crewAI retrying a task after a QueueTimeoutError
+    gives up straight away instead of queueing all over again.
+    """
+    token = _caller.set(_Kickoff(session, tenant, priority))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a call waited longer than the scheduler's max queue wait."""
+
+
+class TokenBucket():
+    """In-process token bucket refilled at rate tokens/second up to capacity."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # When the scheduler last granted through this bucket, for taking turns
+        self.last_granted = -1
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def try_take(self):
+        if not self.ready():
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self):
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class FileTokenBucket():
+    """Token bucket whose state lives in a locked file, so several processes share one provider quota."""
+
+    def __init__(self, path, rate, capacity):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+
+    def _update(self, take):
+        # Only needed (and only available off Windows) when LLM_SCHEDULER_STATE is set
+        import fcntl
+
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = {"tokens": self.capacity, "updated": time.time()}
+                now = time.time()
+                tokens = min(self.capacity, state["tokens"] + max(0.0, now - state["updated"]) * self.rate)
+                taken = take and tokens >= 1
+                if taken:
+                    tokens -= 1
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                return taken, tokens
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def ready(self):
+        return self._update(False)[1] >= 1
+
+    def try_take(self):
+        return self._update(True)[0]
+
+    def wait_time(self):
+        return max(0.0, (1 - self._update(False)[1]) / self.rate)
+
+
+def _burst(rpm):
+    # Roughly ten seconds' worth
+    return max(1.0, rpm / 6.0)
+
+
+def _bucket(rpm, burst=None):
+    return TokenBucket(rpm / 60.0, burst or _burst(rpm))
+
+
+class _Ticket():
+    def __init__(self, session, tenant, priority):
+        self.session = session
+        self.tenant = tenant
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class LLMScheduler():
+    """
+    Process-wide gate in front of every LLM request. Requests queue by priority class and are
+    released only when the provider, tenant and session token buckets all have capacity
+    and a concurrency slot is free, so bursts wait here instead of being rejected upstream.
+    Within a class, tenants take turns, and so do the sessions of each tenant.
+    Tenant and session buckets can burst a full multi-city fan-out; the provider bucket
+    only allows its own short burst.
+    """
+
+    def __init__(self, provider_rpm=60, tenant_rpm=40, session_rpm=20, max_concurrent=4,
+                 max_queue_wait=300, state_file=None, fan_out=MAX_FAN_OUT):
+        self.tenant_rpm = tenant_rpm
+        self.session_rpm = session_rpm
+        self.fan_out = fan_out
+        self.bypass = False
+        self.max_concurrent = max_concurrent
+        self.max_queue_wait = max_queue_wait
+        if state_file:
+            self.provider = FileTokenBucket(state_file, provider_rpm / 60.0, _burst(provider_rpm))
+        else:
+            self.provider = _bucket(provider_rpm)
+        self._tenants = {}
+        self._sessions = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._grants = itertools.count()
+        self._in_flight = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._waits = deque(maxlen=500)
+        self._cond = threading.Condition()
+
+    def _limits_for(self, ticket):
+        for buckets, key, rpm in ((self._tenants, ticket.tenant, self.tenant_rpm),
+                                  (self._sessions, ticket.session, self.session_rpm)):
+            if key not in buckets:
+                if len(buckets) > 1000:
+                    for idle_key in [k for k, b in buckets.items() if b.idle()]:
+                        del buckets[idle_key]
+                buckets[key] = _bucket(rpm, max(_burst(rpm), self.fan_out))
+        return self._tenants[ticket.tenant], self._sessions[ticket.session]
+
+    def _fair_order(self):
+        """
+        Queued entries in release order: by priority class, then round-robin across tenants,
+        each tenant's turns going round-robin across its sessions. Ties go to whoever was
+        served least recently, then to the oldest request. One tenant's fan-out therefore
+        can't hold back everyone else in the same class.
+        """
+        turns = defaultdict(list)
+        session_rounds = defaultdict(int)
+        for entry in sorted(self._queue, key=lambda e: e[:2]):
+            priority, seq, ticket = entry
+            _, session = self._limits_for(ticket)
+            slot = (priority, ticket.tenant, ticket.session)
+            turns[(priority, ticket.tenant)].append((session_rounds[slot], session.last_granted, seq, entry))
+            session_rounds[slot] += 1
+
+        ordered = []
+        for tenant_turns in turns.values():
+            for tenant_round, (_, _, seq, entry) in enumerate(sorted(tenant_turns, key=lambda t: t[:3])):
+                tenant, _ = self._limits_for(entry[2])
+                ordered.append((entry[0], tenant_round, tenant.last_granted, seq, entry))
+        return [entry for *_, entry in sorted(ordered, key=lambda o: o[:4])]
+
+    def _dispatch(self):
+        """Grant queued tickets in fair order, skipping any held back only by their own tenant/session limit."""
+        next_wait = None
+        granted = False
+        for entry in self._fair_order():
+            if self._in_flight >= self.max_concurrent:
+                break
+            ticket = entry[2]
+            tenant, session = self._limits_for(ticket)
+            if not (tenant.ready() and session.ready()):
+                wait = max(tenant.wait_time(), session.wait_time())
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                continue
+            if not self.provider.try_take():
+                # Shared by everyone behind this ticket too
+                wait = self.provider.wait_time()
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                break
+            tenant.try_take()
+            session.try_take()
+            tenant.last_granted = session.last_granted = next(self._grants)
+            ticket.granted = granted = True
+            self._in_flight += 1
+            self._queue.remove(entry)
+            self._waits.append(time.monotonic() - ticket.enqueued)
+        if granted:
+            self._cond.notify_all()
+        return next_wait
+
+    @contextmanager
+    def bypassed(self):
+        """Run requests straight through, e.g. while replaying recorded sessions."""
+        self.bypass = True
+        try:
+            yield
+        finally:
+            self.bypass = False
+
+    def submit(self, fn, *args, session="default", tenant="default", priority=PLAN, kickoff=None, **kwargs):
+        """
+        Wait for a slot for this session/tenant at the given priority, then run fn in the caller's thread.
+        Requests of the same kickoff (see llm_context) share one max queue wait between them.
+        """
+        if self.bypass:
+            return fn(*args, **kwargs)
+        ticket = _Ticket(session, tenant, priority)
+        max_wait = self.max_queue_wait - (kickoff.queued if kickoff else 0.0)
+        with self._cond:
+            entry = (priority, next(self._seq), ticket)
+            self._queue.append(entry)
+            while True:
+                next_wait = self._dispatch()
+                waited = time.monotonic() - ticket.enqueued
+                if ticket.granted:
+                    break
+                remaining = max_wait - waited
+                if remaining <= 0:
+                    self._queue.remove(entry)
+                    self._timeouts += 1
+                    if kickoff:
+                        kickoff.queued += waited
+                    raise QueueTimeoutError("The planner is busy right now, please try again in a moment")
+                self._cond.wait(min(remaining, next_wait if next_wait is not None else 1.0, 1.0))
+        if kickoff:
+            kickoff.queued += waited
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._completed += 1
+                self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _ in self._queue:
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            now = time.monotonic()
+            oldest = max((now - entry[2].enqueued for entry in self._queue), default=0.0)
+            waits = sorted(self._waits)
+            return {
+                "queue_depth": len(self._queue),
+                "queued_by_priority": queued,
+                "oldest_wait_s": round(oldest, 2),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "timeouts": self._timeouts,
+                "wait_s": {
+                    "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                    "max": round(waits[-1], 3) if waits else 0.0,
+                },
+            }
+
+
+# Process-wide instance; set LLM_SCHEDULER_STATE to a shared path to also rate-limit across processes
+scheduler = LLMScheduler(
+    provider_rpm=float(os.getenv("LLM_RPM", "60")),
+    tenant_rpm=float(os.getenv("LLM_TENANT_RPM", "40")),
+    session_rpm=float(os.getenv("LLM_SESSION_RPM", "20")),
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "4")),
+    max_queue_wait=float(os.getenv("LLM_MAX_QUEUE_WAIT", "300")),
+    state_file=os.getenv("LLM_SCHEDULER_STATE"),
+)
+
+
+def install():
+    """
+    Route every crewAI LLM request through the scheduler. Each request (and each retry
+    of it) takes its own token, so a kickoff's agent iterations are all rate-limited.
+    """
+    from crewai.llm import LLM
+
+    if getattr(LLM.call, "_scheduled", False):
+        return
+    real_call = LLM.call
+
+    def call(self, *args, **kwargs):
+        kickoff = _caller.get()
+        if kickoff is None:
+            return scheduler.submit(real_call, self, *args, **kwargs)
+        return scheduler.submit(real_call, self, *args, session=kickoff.session, tenant=kickoff.tenant,
+                                priority=kickoff.priority, kickoff=kickoff, **kwargs)
+
+    call._scheduled = True
+    LLM.call = call
@@ -1,33 +1,56 @@
 #!/usr/bin/env python
+import json
+import os
 import sys
 import warnings
-from datetime import datetime
+from datetime import date, datetime
+
+from crewai import Crew, Task
 
 from sample_project.crew import TourPlanningProject
+from sample_project import route_planner
+from sample_project import plan_store
+from sample_project.upstream_client import upstream
+from sample_project import session_replay
+from sample_project import llm_scheduler
+from sample_project.llm_scheduler import llm_context, PLAN, BATCH
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
-def get_user_input():
+llm_scheduler.install()
+
+def get_user_input(prompt="Enter the city you want to explore: "):
     """
     Get user input for the city they want information about.
     """
-    city = input("Enter the city you want to explore: ").strip()
+    city = input(prompt).strip()
     return city
 
 def run():
     """
-    Run the crew based on user input.
+    Run the crew based on user input, one crew per city in parallel for multi-city trips.
     """
-    destination = get_user_input()
+    destinations = route_planner.order_route(route_planner.parse_destinations(
+        get_user_input("Enter the city you want to explore (comma separate multiple cities): ")
+    ))
+    if not destinations:
+        raise Exception("Please enter at least one destination.")
 
-    inputs = {
-        'destination': destination,
-        'current_year': str(datetime.now().year)
-    }
+    inputs = [
+        {
+            'destination': destination,
+            'current_year': str(datetime.now().year)
+        }
+        for destination in destinations
+    ]
+
+    def kickoff(city_inputs):
+        with llm_context("cli", "cli", PLAN):
+            return TourPlanningProject().crew().kickoff(inputs=city_inputs)
 
     try:
-        print(f"\n🚀 Planning a trip to {destination}... Please wait.\n")
-        TourPlanningProject().crew().kickoff(inputs=inputs)
+        print(f"\n🚀 Planning a trip to {' → '.join(destinations)}... Please wait.\n")
+        route_planner.run_parallel(kickoff, inputs)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
 
@@ -71,5 +94,110 @@ def test():
     except Exception as e:
         raise Exception(f"An error occurred while testing the crew: {e}")
 
+def build_plans():
+    """
+    Pre-generate base plans for the popular trips in config/plan_store.yaml into the plan store.
+    Plans already built for the current prompt version are kept, so the batch can be re-run to fill gaps.
+    """
+    config = plan_store.load_config()
+
+    store = plan_store.get_store()
+    entries = dict(store.items()) if store else {}
+
+    jobs = {}
+    for destination in config['destinations']:
+        for duration in config['durations']:
+            for budget in config['budgets']:
+                for interests in config['interest_sets']:
+                    key = plan_store.plan_key(destination, duration, budget, interests)
+                    if key not in entries and key not in jobs:
+                        jobs[key] = (destination, duration, budget, interests)
+
+    print(f"\n📦 Building {len(jobs)} plans for prompt version {plan_store.prompt_version()} ({len(entries)} already stored)\n")
+
+    def generate(job):
+        destination, duration, budget, interests = job
+        agent = TourPlanningProject().tour_planner()
+        task = Task(
+            description=f"""
+                Plan a trip to {destination} for {duration} days.
+                Budget: ${budget}
+                Interests: {', '.join(interests) or 'General sightseeing'}
+                Keep the plan independent of specific dates and weather so it can be personalised later.
+                """,
+            expected_output="A detailed day-by-day travel plan based on the provided preferences and budget.",
+            agent=agent
+        )
+        try:
+            with llm_context(f"batch:{destination}", "batch", BATCH):
+                result = upstream.call("llm", Crew(agents=[agent], tasks=[task]).kickoff, retries=1)
+            return result.raw
+        except Exception as e:
+            print(f"Skipping {destination} ({duration} days, ${budget}, {interests}): {e}")
+            return None
+
+    for key, plan in zip(jobs, route_planner.run_parallel(generate, jobs.values(), max_workers=4)):
+        if plan:
+            entries[key] = plan
+
+    try:
+        print(f"✅ Plan store written to {plan_store.write_store(entries)} ({len(entries)} plans)")
+    except Exception as e:
+        raise Exception(f"An error occurred while building the plan store: {e}")
+
+def record_session():
+    """
+    Record a live planning session to a cassette without prompting.
+    Usage: record_session <cassette> <destinations> [follow-up message ...]
+    """
+    header = {
+        "destinations": sys.argv[2],
+        "start_date": date.today().isoformat(),
+        "duration": 5,
+        "budget": 1000,
+        "interests": ["Culture", "Food"],
+        "follow_ups": sys.argv[3:],
+    }
+    try:
+        cassette = session_replay.record_session(sys.argv[1], header)
+        print(f"📼 Recorded {len(cassette.records)} calls to {sys.argv[1]}")
+    except Exception as e:
+        raise Exception(f"An error occurred while recording the session: {e}")
+
+def benchmark():
+    """
+    Replay a recorded session and fail if our own overhead regressed against the baseline.
+    Usage: benchmark <cassette> [baseline.json] [timing_scale]
+    The baseline is written on the first run; BENCHMARK_TOLERANCE (default 0.25) sets the allowed slowdown.
+    """
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else None
+    timing_scale = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    tolerance = float(os.getenv("BENCHMARK_TOLERANCE", "0.25"))
+
+    try:
+        result = session_replay.benchmark_session(sys.argv[1], timing_scale=timing_scale)
+    except Exception as e:
+        raise Exception(f"An error occurred while replaying the session: {e}")
+
+    print(result.pop("profile"))
+    print(json.dumps(result, indent=2))
+
+    if not baseline_path:
+        return
+    if not os.path.exists(baseline_path):
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("timing_scale") != result["timing_scale"]:
+        sys.exit(f"❌ Baseline was recorded with timing scale {baseline.get('timing_scale')}, this run used {result['timing_scale']}")
+    limit = baseline["overhead_s"] * (1 + tolerance)
+    if result["overhead_s"] > limit:
+        sys.exit(f"❌ Overhead regressed: {result['overhead_s']}s vs baseline {baseline['overhead_s']}s (limit {limit:.4f}s)")
+    print(f"✅ Overhead {result['overhead_s']}s within {limit:.4f}s")
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import yaml
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), 'config')
+STORE_DIR = os.getenv("PLAN_STORE_DIR", os.path.join(os.path.dirname(__file__), '..', '..', 'artifacts'))
+
+# Prompt files that shape generated plans - editing any of them invalidates the store
+PROMPT_FILES = ['agents.yaml', 'tasks.yaml']
+
+# Bump when the on-disk layout changes
+FORMAT_VERSION = 2
+
+DURATION_BUCKETS = [(1, 2), (3, 4), (5, 7), (8, 14), (15, 30)]
+BUDGET_BUCKETS = [(0, 499), (500, 1499), (1500, 2999), (3000, 10 ** 9)]
+
+# Both files start with the same header: magic and a build id, so a reader can tell
+# whether an index and data file were written by the same build.
+FILE_HEADER = struct.Struct('<4sQ')
+FILE_MAGIC = b'TPPS'
+
+# Index record: 16-byte key digest, data offset, data length. Records are sorted by digest.
+INDEX_RECORD = struct.Struct('<16sQI')
+
+_prompt_version = (None, None)
+_config = None
+
+
+def prompt_version():
+    """Hash of the prompt files, recomputed only when one of them changes on disk."""
+    global _prompt_version
+    paths = [os.path.join(CONFIG_DIR, name) for name in PROMPT_FILES]
+    mtimes = tuple(os.stat(path).st_mtime_ns for path in paths)
+    if _prompt_version[0] != mtimes:
+        digest = hashlib.sha256(f"format-{FORMAT_VERSION}".encode())
+        for path in paths:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _prompt_version = (mtimes, digest.hexdigest()[:12])
+    return _prompt_version[1]
+
+
+def load_config():
+    """The batch build configuration in config/plan_store.yaml."""
+    global _config
+    if _config is None:
+        with open(os.path.join(CONFIG_DIR, 'plan_store.yaml'), encoding='utf-8') as f:
+            _config = yaml.safe_load(f)
+    return _config
+
+
+def _bucket(value, buckets):
+    for index, (low, high) in enumerate(buckets):
+        if low <= value <= high:
+            return index
+    return len(buckets) - 1
+
+
+def plan_key(destination, duration, budget, interests):
+    """Normalised lookup key: (destination, duration bucket, budget bucket, interest set)."""
+    return (
+        destination.strip().lower(),
+        _bucket(duration, DURATION_BUCKETS),
+        _bucket(budget, BUDGET_BUCKETS),
+        tuple(sorted(i.lower() for i in interests)),
+    )
+
+
+def nearest_interest_sets(interests, candidates):
+    """
+    Candidate interest sets ordered from the closest to interests (most overlap relative to
+    both sets, then fewest interests the traveller didn't ask for). Sets sharing nothing with
+    interests are dropped, except the general (empty) set which is always the last resort.
+    """
+    wanted = {i.lower() for i in interests}
+    ranked = []
+    for candidate in {tuple(sorted(i.lower() for i in c)) for c in candidates} | {()}:
+        shared = len(wanted & set(candidate))
+        if candidate and not shared:
+            continue
+        union = len(wanted | set(candidate)) or 1
+        ranked.append((-shared / union, len(set(candidate) - wanted), candidate))
+    return [candidate for _, _, candidate in sorted(ranked)]
+
+
+def _digest(key):
+    return hashlib.blake2b(json.dumps(key).encode(), digest_size=16).digest()
+
+
+def _paths(version, store_dir=None):
+    base = os.path.join(store_dir or STORE_DIR, f"plans-{version}")
+    return base + '.idx', base + '.dat'
+
+
+def write_store(entries, version=None, store_dir=None):
+    """
+    Write {key: plan} entries as a new store for the given prompt version.
+    Plans are zlib-compressed into one data file next to a sorted index. Each file is
+    swapped in atomically, and both carry the same build id so a reader that catches
+    the new data file with the old index (or the other way round) rejects the pair.
+    """
+    version = version or prompt_version()
+    index_path, data_path = _paths(version, store_dir)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    header = FILE_HEADER.pack(FILE_MAGIC, time.time_ns())
+
+    records = []
+    with open(data_path + '.tmp', 'wb') as data_file:
+        data_file.write(header)
+        for key, plan in entries.items():
+            blob = zlib.compress(json.dumps({"key": key, "plan": plan, "created": time.time()}).encode())
+            records.append((_digest(key), data_file.tell(), len(blob)))
+            data_file.write(blob)
+
+    with open(index_path + '.tmp', 'wb') as index_file:
+        index_file.write(header)
+        for record in sorted(records):
+            index_file.write(INDEX_RECORD.pack(*record))
+
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(index_path + '.tmp', index_path)
+    return index_path
+
+
+class PlanStore():
+    """Read-only view over one store version, with the index memory-mapped for binary search."""
+
+    def __init__(self, index_path, data_path):
+        self.mtime = os.path.getmtime(index_path)
+        with open(index_path, 'rb') as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(data_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._lock = threading.Lock()
+        try:
+            index_header = FILE_HEADER.unpack_from(self.index)
+            data_header = FILE_HEADER.unpack_from(self.data)
+        except struct.error:
+            index_header = data_header = None
+        if index_header is None or index_header[0] != FILE_MAGIC or index_header != data_header:
+            self.close()
+            raise ValueError(f"{index_path} and {data_path} are not from the same build")
+        self.count = (len(self.index) - FILE_HEADER.size) // INDEX_RECORD.size
+
+    def _record(self, position):
+        return INDEX_RECORD.unpack_from(self.index, FILE_HEADER.size + position * INDEX_RECORD.size)
+
+    def close(self):
+        with self._lock:
+            self.index.close()
+            self.data.close()
+
+    def _find(self, digest):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record[0] < digest:
+                low = middle + 1
+            elif record[0] > digest:
+                high = middle
+            else:
+                return record
+        return None
+
+    def lookup(self, key):
+        with self._lock:
+            if self.index.closed:
+                return None
+            record = self._find(_digest(key))
+            if record is None:
+                return None
+            _, offset, length = record
+            entry = json.loads(zlib.decompress(self.data[offset:offset + length]))
+        # Guard against digest collisions
+        if tuple(entry["key"][:3]) + (tuple(entry["key"][3]),) != tuple(key):
+            return None
+        return entry["plan"]
+
+    def lookup_nearest(self, key, interest_sets):
+        """The plan for key, or failing that for the closest of interest_sets with the same destination and buckets."""
+        plan = self.lookup(key)
+        if plan is not None:
+            return plan
+        for interests in nearest_interest_sets(key[3], interest_sets):
+            if interests != tuple(key[3]):
+                plan = self.lookup(key[:3] + (interests,))
+                if plan is not None:
+                    return plan
+        return None
+
+    def items(self):
+        for position in range(self.count):
+            with self._lock:
+                _, offset, length = self._record(position)
+                entry = json.loads(zlib.decompress(self.data[offset:offset + length]))
+            yield tuple(entry["key"][:3]) + (tuple(entry["key"][3]),), entry["plan"]
+
+    def __len__(self):
+        return self.count
+
+
+_stores = {}
+_lock = threading.Lock()
+
+
+def get_store(store_dir=None):
+    """
+    The store for the current prompt version, or None if it hasn't been built yet.
+    Stores superseded by a rebuild or a prompt change are closed.
+    """
+    index_path, data_path = _paths(prompt_version(), store_dir)
+    if not (os.path.exists(index_path) and os.path.exists(data_path)):
+        return None
+    with _lock:
+        for path in [p for p in _stores if p != index_path and os.path.dirname(p) == os.path.dirname(index_path)]:
+            _stores.pop(path).close()
+        store = _stores.get(index_path)
+        if store is None or store.mtime != os.path.getmtime(index_path):
+            try:
+                fresh = PlanStore(index_path, data_path)
+            except ValueError:
+                # Caught mid-rebuild - keep serving the previous build until both files are swapped in
+                return store
+            if store is not None:
+                store.close()
+            store = _stores[index_path] = fresh
+        return store
+
+
+def lookup_plan(destination, duration, budget, interests):
+    store = get_store()
+    if store is None:
+        return None
+    # Only a handful of interest sets are pre-built, so fall back to the closest one
+    return store.lookup_nearest(plan_key(destination, duration, budget, interests), load_config()['interest_sets'])
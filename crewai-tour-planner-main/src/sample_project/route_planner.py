@@ -0,0 +1,132 @@
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import yaml
+
+COORDINATES_FILE = os.path.join(os.path.dirname(__file__), 'config', 'city_coordinates.yaml')
+
+# Separators accepted between cities, e.g. "Madurai; Trichy", "Chennai, Ooty -> Mysore".
+# Not "and" - it is part of real place names such as "Trinidad and Tobago".
+DESTINATION_SEPARATORS = re.compile(r",|;|&|->|→")
+
+_coordinates = None
+
+
+def load_coordinates():
+    global _coordinates
+    if _coordinates is None:
+        with open(COORDINATES_FILE, encoding='utf-8') as f:
+            _coordinates = {city.lower(): tuple(coords) for city, coords in yaml.safe_load(f).items()}
+    return _coordinates
+
+
+def parse_destinations(text):
+    """Split a free-text destination field into a de-duplicated list of cities."""
+    cities = []
+    for city in DESTINATION_SEPARATORS.split(text or ""):
+        city = city.strip()
+        if city and city.lower() not in [c.lower() for c in cities]:
+            cities.append(city)
+    return cities
+
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def _path_length(path, coords):
+    return sum(haversine_km(coords[path[i]], coords[path[i + 1]]) for i in range(len(path) - 1))
+
+
+def _optimise(route, coords):
+    """Nearest-neighbour construction from route[0], then 2-opt with the start fixed."""
+    if len(route) < 3:
+        return route
+
+    ordered = [route[0]]
+    remaining = route[1:]
+    while remaining:
+        nearest = min(remaining, key=lambda c: haversine_km(coords[ordered[-1]], coords[c]))
+        ordered.append(nearest)
+        remaining.remove(nearest)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(ordered) - 1):
+            for j in range(i + 1, len(ordered)):
+                candidate = ordered[:i] + ordered[i:j + 1][::-1] + ordered[j + 1:]
+                if _path_length(candidate, coords) < _path_length(ordered, coords) - 1e-9:
+                    ordered = candidate
+                    improved = True
+    return ordered
+
+
+def order_route(cities):
+    """
+    Order cities into a short open route that always starts at the first city given.
+    Cities without known coordinates after the first are appended at the end in their original order.
+    """
+    if not cities:
+        return []
+    table = load_coordinates()
+    start, rest = cities[0], cities[1:]
+    known = [c for c in rest if c.lower() in table]
+    unknown = [c for c in rest if c.lower() not in table]
+    coords = {c: table[c.lower()] for c in known}
+
+    if start.lower() in table:
+        coords[start] = table[start.lower()]
+        return _optimise([start] + known, coords) + unknown
+    # No coordinates for the start - order the rest from the first known city instead
+    return [start] + _optimise(known, coords) + unknown
+
+
+def split_days(cities, duration, start_date, budget=None):
+    """Split the trip days (and budget) across the ordered cities, earlier cities taking any remainder."""
+    if not cities:
+        raise ValueError("Please enter at least one destination.")
+    if duration < len(cities):
+        raise ValueError(f"A {duration}-day trip is too short to visit {len(cities)} destinations.")
+
+    legs = []
+    offset = 0
+    for index, city in enumerate(cities):
+        days = duration // len(cities) + (1 if index < duration % len(cities) else 0)
+        legs.append({
+            "city": city,
+            "days": days,
+            "start_date": start_date + timedelta(days=offset),
+            "budget": round(budget * days / duration) if budget is not None else None,
+        })
+        offset += days
+    if budget is not None:
+        # Rounding can be off by a little - the first leg absorbs it so legs add up to the total
+        legs[0]["budget"] += budget - sum(leg["budget"] for leg in legs)
+    return legs
+
+
+def run_parallel(fn, items, max_workers=8):
+    """Apply fn to every item concurrently, returning results in input order."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+
+def merge_plans(legs, plans):
+    """Merge per-city sub-itineraries into a single markdown plan."""
+    sections = ["**Route:** " + " → ".join(leg["city"] for leg in legs)]
+    day = 1
+    for leg, plan in zip(legs, plans):
+        last_day = day + leg["days"] - 1
+        days_label = f"Day {day}" if day == last_day else f"Days {day}-{last_day}"
+        sections.append(f"### {days_label}: {leg['city']} (from {leg['start_date']})\n\n{plan}")
+        day = last_day + 1
+    return "\n\n---\n\n".join(sections)
@@ -0,0 +1,343 @@
+import cProfile
+import gzip
+import hashlib
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import date
+from urllib.parse import urlparse
+
+import litellm
+import requests
+
+from sample_project.llm_scheduler import scheduler
+
+APP_SCRIPT = os.path.join(os.path.dirname(__file__), 'app.py')
+
+# Only these hosts are captured; any other HTTP traffic passes through untouched
+RECORDED_HOSTS = {"api.weatherapi.com"}
+
+# Never written to a cassette
+SECRET_PARAMS = {"key", "api_key"}
+
+
+def _request_key(kind, payload):
+    return kind + ":" + hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class Cassette():
+    """A recorded session: one header plus every LLM and weather exchange, stored as gzipped JSON lines."""
+
+    def __init__(self, header=None, records=None):
+        self.header = header or {}
+        self.records = records or []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def save(self, path):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps(self.header, separators=(',', ':')) + "\n")
+            for record in sorted(self.records, key=lambda r: r["t"]):
+                f.write(json.dumps(record, separators=(',', ':'), default=str) + "\n")
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        return cls(lines[0], lines[1:])
+
+
+class _RecordedResponse():
+    """Just enough of requests.Response for the upstream client."""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return json.loads(self._body)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} (replayed)", response=self)
+
+
+@contextmanager
+def recording(cassette):
+    """Capture every LLM completion and weather request made inside the block."""
+    started = time.monotonic()
+    real_completion = litellm.completion
+    real_get = requests.Session.get
+
+    def completion(*args, **kwargs):
+        request = {"model": kwargs.get("model"), "messages": kwargs.get("messages")}
+        t = time.monotonic()
+        response = real_completion(*args, **kwargs)
+        cassette.add({
+            "kind": "llm",
+            "key": _request_key("llm", request),
+            "t": t - started,
+            "elapsed": time.monotonic() - t,
+            "request": request,
+            "response": response.model_dump(),
+        })
+        return response
+
+    def get(session, url, params=None, **kwargs):
+        if urlparse(url).netloc not in RECORDED_HOSTS:
+            return real_get(session, url, params=params, **kwargs)
+        request = {"url": url, "params": {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}}
+        t = time.monotonic()
+        response = real_get(session, url, params=params, **kwargs)
+        cassette.add({
+            "kind": "http",
+            "key": _request_key("http", request),
+            "t": t - started,
+            "elapsed": time.monotonic() - t,
+            "request": request,
+            "response": {"status_code": response.status_code, "body": response.text},
+        })
+        return response
+
+    litellm.completion = completion
+    requests.Session.get = get
+    try:
+        yield cassette
+    finally:
+        litellm.completion = real_completion
+        requests.Session.get = real_get
+
+
+class Replayer():
+    """Serves recorded responses, matched by request and falling back to recording order."""
+
+    def __init__(self, cassette, timing_scale=0.0):
+        self.timing_scale = timing_scale
+        self.delays = []
+        self.unmatched = 0
+        self._by_key = defaultdict(deque)
+        self._by_kind = defaultdict(deque)
+        self._used = set()
+        self._lock = threading.Lock()
+        for index, record in enumerate(cassette.records):
+            self._by_key[record["key"]].append(index)
+            self._by_kind[record["kind"]].append(index)
+        self.records = cassette.records
+
+    def _next(self, kind, key):
+        with self._lock:
+            for queue in (self._by_key[key], self._by_kind[kind]):
+                while queue and queue[0] in self._used:
+                    queue.popleft()
+                if queue:
+                    index = queue.popleft()
+                    self._used.add(index)
+                    if queue is self._by_kind[kind]:
+                        self.unmatched += 1
+                    record = self.records[index]
+                    break
+            else:
+                raise LookupError(f"Cassette has no more {kind} responses")
+        delay = record["elapsed"] * self.timing_scale
+        if delay:
+            started = time.perf_counter()
+            time.sleep(delay)
+            with self._lock:
+                self.delays.append((started, time.perf_counter()))
+        return record["response"]
+
+    def upstream_time(self, window_start, window_end):
+        """
+        Time within the window during which at least one simulated upstream call was in flight.
+        Calls overlap (parallel weather lookups, one crew per city), so this is the union of
+        their intervals rather than the sum.
+        """
+        with self._lock:
+            intervals = sorted((max(a, window_start), min(b, window_end)) for a, b in self.delays)
+        total = 0.0
+        current_start = current_end = None
+        for a, b in intervals:
+            if b <= a:
+                continue
+            if current_end is None or a > current_end:
+                if current_end is not None:
+                    total += current_end - current_start
+                current_start, current_end = a, b
+            else:
+                current_end = max(current_end, b)
+        if current_end is not None:
+            total += current_end - current_start
+        return total
+
+    def completion(self, *args, **kwargs):
+        request = {"model": kwargs.get("model"), "messages": kwargs.get("messages")}
+        return litellm.ModelResponse(**self._next("llm", _request_key("llm", request)))
+
+    def get(self, url, params=None):
+        request = {"url": url, "params": {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}}
+        response = self._next("http", _request_key("http", request))
+        return _RecordedResponse(response["status_code"], response["body"])
+
+
+@contextmanager
+def replaying(cassette, timing_scale=0.0):
+    """Answer LLM and weather calls from the cassette instead of the network."""
+    replayer = Replayer(cassette, timing_scale)
+    real_completion = litellm.completion
+    real_get = requests.Session.get
+
+    def get(session, url, params=None, **kwargs):
+        if urlparse(url).netloc not in RECORDED_HOSTS:
+            return real_get(session, url, params=params, **kwargs)
+        return replayer.get(url, params)
+
+    litellm.completion = replayer.completion
+    requests.Session.get = get
+    try:
+        yield replayer
+    finally:
+        litellm.completion = real_completion
+        requests.Session.get = real_get
+
+
+class ThreadProfiler():
+    """
+    Profiles the calling thread and every thread started while active - the AppTest script
+    thread and the app's worker threads, where prompt building, parsing, rendering and
+    orchestration run.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def _start(self, frame, event, arg):
+        # First profile event of a new thread: swap this hook for a real profiler
+        sys.setprofile(None)
+        self._add().enable()
+
+    def _add(self):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profiler)
+        return profiler
+
+    def __enter__(self):
+        self.profiles = []
+        self.stats = None
+        self._add().enable()
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start)
+        # From 3.12 cProfile runs on sys.monitoring: one profiler sees every thread, and
+        # enabling a second one anywhere in the process fails
+        return self
+
+    def __exit__(self, *exc_info):
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        for profiler in self.profiles:
+            profiler.disable()
+        # Before 3.12 another thread's profiler can't be unhooked from here, so snapshot
+        # now - a thread still running after the window doesn't leak into the report
+        for profiler in self.profiles:
+            try:
+                self.stats = pstats.Stats(profiler) if self.stats is None else self.stats.add(profiler)
+            except TypeError:
+                # Thread finished without any profiled calls
+                continue
+
+    def report(self, limit=25):
+        if self.stats is None:
+            return ""
+        self.stats.stream = io.StringIO()
+        self.stats.sort_stats('cumulative').print_stats(limit)
+        return self.stats.stream.getvalue()
+
+
+def start_app(timeout=600):
+    """Load the Streamlit app headlessly and render it once - harness setup, not part of a session."""
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(APP_SCRIPT, default_timeout=timeout).run()
+
+
+def drive_session(at, header):
+    """
+    Drive one planning session on the Plan tab: generate a plan for header["destinations"],
+    then send each follow-up chat message.
+    """
+    at.text_input[0].input(header["destinations"])
+    at.date_input[0].set_value(date.fromisoformat(header["start_date"]))
+    at.number_input[0].set_value(header["duration"])
+    at.slider[0].set_value(header["budget"])
+    at.multiselect[0].set_value(header["interests"])
+    at.button(key="generate").click().run()
+
+    for message in header.get("follow_ups", []):
+        at.text_area(key="user_input_plan").input(message)
+        at.button(key="submit_plan").click().run()
+
+    if at.exception:
+        raise Exception(f"App session failed: {at.exception[0].message}")
+    return at
+
+
+def run_app_session(header, timeout=600):
+    return drive_session(start_app(timeout), header)
+
+
+def record_session(path, header):
+    """
+    Run a live session and save every upstream exchange to the cassette at path.
+    The cassette is saved even if the session fails part-way, so paid calls aren't lost.
+    """
+    cassette = Cassette(header)
+    try:
+        with recording(cassette):
+            run_app_session(header)
+    finally:
+        cassette.save(path)
+    return cassette
+
+
+def benchmark_session(path, timing_scale=0.0, repeat=3):
+    """
+    Replay a cassette repeat times and report our own overhead - session wall time minus the
+    time some simulated upstream call was in flight - using the fastest run, with a profile
+    of every thread in that run. The LLM scheduler is bypassed so throttling isn't measured.
+    """
+    cassette = Cassette.load(path)
+    runs = []
+    with scheduler.bypassed():
+        for _ in range(repeat):
+            with replaying(cassette, timing_scale) as replayer:
+                at = start_app()
+                with ThreadProfiler() as profiler:
+                    started = time.perf_counter()
+                    drive_session(at, cassette.header)
+                    finished = time.perf_counter()
+            upstream = replayer.upstream_time(started, finished)
+            runs.append((finished - started - upstream, finished - started, upstream, replayer, profiler))
+
+    overhead, wall, upstream, replayer, profiler = min(runs, key=lambda run: run[0])
+    return {
+        "timing_scale": timing_scale,
+        "overhead_s": round(overhead, 4),
+        "wall_s": round(wall, 4),
+        "upstream_s": round(upstream, 4),
+        "recorded_upstream_s": round(sum(r["elapsed"] for r in cassette.records), 4),
+        "llm_calls": sum(1 for r in cassette.records if r["kind"] == "llm"),
+        "http_calls": sum(1 for r in cassette.records if r["kind"] == "http"),
+        "unmatched": replayer.unmatched,
+        "profile": profiler.report(),
+    }
@@ -0,0 +1,220 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+
+# Status codes worth retrying - everything else is treated as a final answer
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# LLM provider errors (litellm exception names) that are worth retrying
+TRANSIENT_ERROR_NAMES = {
+    "RateLimitError", "APIConnectionError", "Timeout", "APITimeoutError",
+    "ServiceUnavailableError", "InternalServerError", "BadGatewayError",
+}
+
+
+def is_transient(error):
+    """Whether error looks like a passing upstream problem rather than a bad request or credentials."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status in RETRYABLE_STATUS:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def describe_failure(url, error):
+    """Loggable summary of a failed request - never the full URL or message, which carry the API key."""
+    parts = urlparse(url)
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return f"{parts.netloc}{parts.path}: {type(error).__name__}" + (f" (HTTP {status})" if status else "")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because the upstream is marked down."""
+
+
+class CircuitBreaker():
+    """Per-host breaker: closed -> open after repeated failures -> half-open probe after a cool-down."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                # Let a single probe through, everyone else keeps failing fast
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release(self):
+        """The call failed for a reason unrelated to upstream health - let the next call probe again."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.open_count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "open_count": self.open_count}
+
+
+class UpstreamClient():
+    """Shared client for weather and LLM calls with retries, circuit breaking and stale fallbacks."""
+
+    def __init__(self, max_retries=2, backoff_base=0.3, backoff_cap=3.0, timeout=(3.05, 10),
+                 failure_threshold=5, reset_timeout=30, stale_ttl=6 * 60 * 60, max_cached=1000):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stale_ttl = stale_ttl
+        self.max_cached = max_cached
+        self.session = requests.Session()
+        self._breakers = {}
+        # Last good value per request, oldest first
+        self._cache = OrderedDict()
+        self._counters = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0, "stale": 0, "fallback": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _sleep_backoff(self, attempt):
+        # Full jitter so concurrent sessions don't retry in lock-step
+        time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+
+    def call(self, host, fn, *args, retries=None, **kwargs):
+        """
+        Run fn through the breaker for host, retrying transient errors with jittered backoff.
+        Other errors are raised straight away and don't count against the upstream's health.
+        """
+        breaker = self.breaker(host)
+        retries = self.max_retries if retries is None else retries
+        self._count("calls")
+
+        last_error = None
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                self._count("short_circuited")
+                if last_error is not None:
+                    # The breaker opened while retrying - surface the error that opened it
+                    raise last_error
+                raise CircuitOpenError(f"{host} is unavailable, try again shortly")
+            if attempt:
+                self._count("retries")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                self._count("failures")
+                if attempt == retries:
+                    raise
+                last_error = e
+                self._sleep_backoff(attempt)
+            else:
+                breaker.record_success()
+                return result
+
+    def _remember(self, cache_key, result):
+        with self._lock:
+            self._cache[cache_key] = (time.monotonic(), result)
+            self._cache.move_to_end(cache_key)
+            # Keys come from free-text city names, so drop expired entries (oldest first) and cap the rest
+            now = time.monotonic()
+            while self._cache and (len(self._cache) > self.max_cached
+                                   or now - next(iter(self._cache.values()))[0] >= self.stale_ttl):
+                self._cache.popitem(last=False)
+
+    def _get(self, url, params):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        if response.status_code in RETRYABLE_STATUS:
+            response.raise_for_status()
+        return response
+
+    def get_json(self, url, params=None, parse=None, fallback=None):
+        """
+        GET url and return parse(json). When the upstream fails, serve the last good
+        (stale) value for the same request, then fallback(), marking either with "degraded".
+        """
+        cache_key = (url, tuple(sorted((params or {}).items())))
+        try:
+            response = self.call(urlparse(url).netloc, self._get, url, params)
+            if response.status_code == 200:
+                data = response.json()
+                result = parse(data) if parse else data
+                self._remember(cache_key, result)
+                return result
+        except Exception as e:
+            print(f"Upstream request to {describe_failure(url, e)} failed")
+
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] >= self.stale_ttl:
+                del self._cache[cache_key]
+                cached = None
+        if cached:
+            self._count("stale")
+            return dict(cached[1], degraded="stale")
+
+        if fallback:
+            result = fallback()
+            if result is not None:
+                self._count("fallback")
+                return dict(result, degraded="fallback")
+        return None
+
+    def metrics(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+            counters = dict(self._counters)
+        return {
+            "breakers": {host: breaker.snapshot() for host, breaker in breakers.items()},
+            "counters": counters,
+            "cached_entries": len(self._cache),
+        }
+
+
+# Process-wide instance so breaker state and the stale cache are shared across sessions
+upstream = UpstreamClient()
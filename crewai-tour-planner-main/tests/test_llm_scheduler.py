@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from sample_project import llm_scheduler
+from sample_project.llm_scheduler import BATCH, INTERACTIVE, PLAN, LLMScheduler, QueueTimeoutError, TokenBucket
+
+
+def test_token_bucket_refills_at_rate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=1.0, capacity=2)
+
+    assert bucket.try_take() and bucket.try_take()
+    assert not bucket.try_take()
+    assert bucket.wait_time() == pytest.approx(1.0)
+    now[0] += 1.0
+    assert bucket.try_take()
+
+
+def test_higher_priority_runs_first():
+    scheduler = LLMScheduler(provider_rpm=6000, tenant_rpm=6000, session_rpm=6000, max_concurrent=1)
+    release = threading.Event()
+    order = []
+
+    blocker = threading.Thread(target=scheduler.submit, args=(release.wait,))
+    blocker.start()
+    while scheduler.metrics()["in_flight"] == 0:
+        time.sleep(0.001)
+
+    threads = []
+    for name, priority in [("batch", BATCH), ("plan", PLAN), ("chat", INTERACTIVE)]:
+        thread = threading.Thread(target=scheduler.submit, args=(order.append, name), kwargs={"priority": priority})
+        thread.start()
+        threads.append(thread)
+        while scheduler.metrics()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+
+    assert scheduler.metrics()["queued_by_priority"] == {"interactive": 1, "plan": 1, "batch": 1}
+    release.set()
+    for thread in [blocker] + threads:
+        thread.join(5)
+    assert order == ["chat", "plan", "batch"]
+
+
+def test_session_limit_does_not_block_other_sessions():
+    scheduler = LLMScheduler(provider_rpm=6000, tenant_rpm=6000, session_rpm=0.01, fan_out=1, max_queue_wait=5)
+    scheduler.submit(lambda: None, session="busy")
+
+    started = time.monotonic()
+    scheduler.submit(lambda: None, session="other")
+    assert time.monotonic() - started < 0.5
+
+
+def test_queue_timeout_when_over_quota():
+    scheduler = LLMScheduler(provider_rpm=0.01, max_queue_wait=0.2)
+    scheduler.submit(lambda: None)
+
+    with pytest.raises(QueueTimeoutError):
+        scheduler.submit(lambda: None)
+    metrics = scheduler.metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["queue_depth"] == 0
+
+
+def test_session_burst_covers_a_full_fan_out():
+    scheduler = LLMScheduler(provider_rpm=6000, tenant_rpm=6, session_rpm=6, max_queue_wait=0.2)
+    for _ in range(llm_scheduler.MAX_FAN_OUT):
+        scheduler.submit(lambda: None, session="trip")
+
+
+def test_bypass_skips_limits():
+    scheduler = LLMScheduler(provider_rpm=0.01, max_queue_wait=0.1)
+    scheduler.submit(lambda: None)
+    with scheduler.bypassed():
+        assert scheduler.submit(lambda: "ran") == "ran"
+
+
+def test_llm_context_is_restored():
+    with llm_scheduler.llm_context("s1", "t1", INTERACTIVE):
+        kickoff = llm_scheduler._caller.get()
+        assert (kickoff.session, kickoff.tenant, kickoff.priority) == ("s1", "t1", INTERACTIVE)
+    assert llm_scheduler._caller.get() is None
+
+
+def test_requests_of_one_kickoff_share_the_queue_wait():
+    scheduler = LLMScheduler(provider_rpm=0.01, max_queue_wait=0.2)
+    scheduler.submit(lambda: None)
+
+    with llm_scheduler.llm_context("s1", "t1", INTERACTIVE):
+        kickoff = llm_scheduler._caller.get()
+        with pytest.raises(QueueTimeoutError):
+            scheduler.submit(lambda: None, kickoff=kickoff)
+        # A retry of the same kickoff (as crewAI does) gives up without queueing again
+        started = time.monotonic()
+        with pytest.raises(QueueTimeoutError):
+            scheduler.submit(lambda: None, kickoff=kickoff)
+        assert time.monotonic() - started < 0.1
+
+
+class Gate():
+    """Provider bucket that only lets through the tokens the test hands out."""
+
+    def __init__(self):
+        self.tokens = 0
+
+    def ready(self):
+        return self.tokens >= 1
+
+    def try_take(self):
+        if not self.tokens:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self):
+        return 0.01
+
+
+def test_tenants_and_sessions_take_turns_within_a_class():
+    scheduler = LLMScheduler(tenant_rpm=6000, session_rpm=6000, max_concurrent=100, max_queue_wait=5)
+    scheduler.provider = gate = Gate()
+    order = []
+
+    threads = []
+    for name, session, tenant in [("a1", "a1", "A")] * 10 + [("a2", "a2", "A"), ("b", "b", "B")]:
+        thread = threading.Thread(target=scheduler.submit, args=(order.append, name),
+                                  kwargs={"session": session, "tenant": tenant})
+        thread.start()
+        threads.append(thread)
+        while scheduler.metrics()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+
+    for released in range(1, 4):
+        gate.tokens = 1
+        while len(order) < released:
+            time.sleep(0.001)
+    assert order == ["a1", "b", "a2"]
+
+    gate.tokens = 100
+    for thread in threads:
+        thread.join(5)
+    assert len(order) == 12
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from sample_project import plan_store
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_plan_key_buckets_and_normalises():
+    assert plan_store.plan_key(" Athens ", 6, 1400, ["History", "culture"]) == ("athens", 2, 1, ("culture", "history"))
+    assert plan_store.plan_key("Athens", 30, 10 ** 6, []) == ("athens", 4, 3, ())
+
+
+def test_lookup_finds_every_entry_by_binary_search(store_dir):
+    entries = {
+        plan_store.plan_key(f"City {n}", n % 30 + 1, n * 100, ["Food"] if n % 2 else []): f"plan {n}"
+        for n in range(50)
+    }
+    plan_store.write_store(entries, store_dir=store_dir)
+    store = plan_store.get_store(store_dir)
+
+    assert len(store) == 50
+    for key, plan in entries.items():
+        assert store.lookup(key) == plan
+    assert store.lookup(plan_store.plan_key("Nowhere", 3, 100, [])) is None
+    assert dict(store.items()) == entries
+
+
+def test_store_is_versioned_by_prompts(store_dir):
+    key = plan_store.plan_key("Athens", 5, 1000, [])
+    plan_store.write_store({key: "old prompts"}, version="outdated", store_dir=store_dir)
+    assert plan_store.get_store(store_dir) is None
+
+
+def test_prompt_version_is_cached_until_files_change(monkeypatch, tmp_path):
+    for name in plan_store.PROMPT_FILES:
+        (tmp_path / name).write_text("v1")
+    monkeypatch.setattr(plan_store, "CONFIG_DIR", str(tmp_path))
+    first = plan_store.prompt_version()
+
+    reads = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: reads.append(a[0]) or real_open(*a, **k))
+    assert plan_store.prompt_version() == first
+    assert reads == []
+
+    path = tmp_path / plan_store.PROMPT_FILES[0]
+    path.write_text("v2")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert plan_store.prompt_version() != first
+
+
+def test_mismatched_index_and_data_are_rejected(store_dir):
+    key = plan_store.plan_key("Athens", 5, 1000, [])
+    plan_store.write_store({key: "first"}, store_dir=store_dir)
+    store = plan_store.get_store(store_dir)
+    index_path, data_path = plan_store._paths(plan_store.prompt_version(), store_dir)
+
+    # Simulate a reader arriving between the two swaps of a rebuild: new data, old index
+    with open(index_path, 'rb') as f:
+        old_index = f.read()
+    plan_store.write_store({key: "second"}, store_dir=store_dir)
+    with open(index_path, 'wb') as f:
+        f.write(old_index)
+    os.utime(index_path, ns=(0, os.stat(index_path).st_mtime_ns + 10 ** 9))
+
+    with pytest.raises(ValueError):
+        plan_store.PlanStore(index_path, data_path)
+    # The previous build keeps serving
+    assert plan_store.get_store(store_dir) is store
+    assert store.lookup(key) == "first"
+
+
+def test_rebuilt_store_closes_previous_mmaps(store_dir):
+    key = plan_store.plan_key("Athens", 5, 1000, [])
+    plan_store.write_store({key: "first"}, store_dir=store_dir)
+    old = plan_store.get_store(store_dir)
+    index_path, _ = plan_store._paths(plan_store.prompt_version(), store_dir)
+
+    plan_store.write_store({key: "second"}, store_dir=store_dir)
+    os.utime(index_path, ns=(0, os.stat(index_path).st_mtime_ns + 10 ** 9))
+    new = plan_store.get_store(store_dir)
+
+    assert new.lookup(key) == "second"
+    assert old.index.closed and old.data.closed
+    assert old.lookup(key) is None
+
+
+def test_nearest_interest_sets_prefers_overlap_then_fewer_extras():
+    candidates = [[], ["Culture", "History"], ["Food"], ["Adventure", "Nature"]]
+    assert plan_store.nearest_interest_sets(["Culture", "Food"], candidates) == [("food",), ("culture", "history"), ()]
+    assert plan_store.nearest_interest_sets(["Shopping"], candidates) == [()]
+
+
+def test_lookup_plan_falls_back_to_nearest_interest_set(monkeypatch, store_dir):
+    monkeypatch.setattr(plan_store, "STORE_DIR", store_dir)
+    plan_store.write_store({
+        plan_store.plan_key("Athens", 5, 1000, []): "general",
+        plan_store.plan_key("Athens", 5, 1000, ["Culture", "History"]): "culture",
+        plan_store.plan_key("Athens", 5, 1000, ["Food"]): "food",
+    })
+
+    assert plan_store.lookup_plan("Athens", 5, 1000, ["Food"]) == "food"
+    assert plan_store.lookup_plan("Athens", 5, 1000, ["Culture"]) == "culture"
+    assert plan_store.lookup_plan("Athens", 5, 1000, ["History", "Food", "Culture"]) == "culture"
+    assert plan_store.lookup_plan("Athens", 5, 1000, ["Shopping"]) == "general"
+    assert plan_store.lookup_plan("Chennai", 5, 1000, ["Food"]) is None
@@ -0,0 +1,73 @@
+import itertools
+from datetime import date
+
+import pytest
+
+from sample_project import route_planner
+
+
+def route_length(route):
+    coords = route_planner.load_coordinates()
+    return sum(
+        route_planner.haversine_km(coords[a.lower()], coords[b.lower()])
+        for a, b in zip(route, route[1:])
+    )
+
+
+def test_parse_destinations_splits_and_dedupes():
+    assert route_planner.parse_destinations("Madurai; Trichy, madurai -> Ooty") == ["Madurai", "Trichy", "Ooty"]
+
+
+def test_parse_destinations_keeps_names_containing_and():
+    assert route_planner.parse_destinations("Trinidad and Tobago, Bosnia and Herzegovina") == [
+        "Trinidad and Tobago", "Bosnia and Herzegovina"
+    ]
+    assert route_planner.parse_destinations(",") == []
+    assert route_planner.parse_destinations("") == []
+
+
+def test_order_route_keeps_start_and_shortens_route():
+    cities = ["Chennai", "Kanyakumari", "Pondicherry", "Madurai", "Trichy"]
+    route = route_planner.order_route(cities)
+    assert route[0] == "Chennai"
+    assert sorted(route) == sorted(cities)
+    assert route_length(route) < route_length(cities)
+
+
+def test_order_route_is_close_to_brute_force_on_small_trip():
+    cities = ["Madurai", "Chennai", "Ooty", "Kochi", "Trichy", "Bangalore"]
+    best = min(
+        (["Madurai"] + list(rest) for rest in itertools.permutations(cities[1:])),
+        key=route_length,
+    )
+    # A local heuristic, so allow a small gap to the optimum
+    assert route_length(route_planner.order_route(cities)) <= route_length(best) * 1.1
+
+
+def test_order_route_keeps_unknown_start_first():
+    assert route_planner.order_route(["Foo", "Madurai", "Trichy"]) == ["Foo", "Madurai", "Trichy"]
+    assert route_planner.order_route(["Madurai", "Foo", "Trichy"]) == ["Madurai", "Trichy", "Foo"]
+
+
+def test_split_days_covers_duration_and_budget():
+    legs = route_planner.split_days(["A", "B", "C"], 7, date(2026, 1, 1), 1000)
+    assert [leg["days"] for leg in legs] == [3, 2, 2]
+    assert [leg["start_date"] for leg in legs] == [date(2026, 1, 1), date(2026, 1, 4), date(2026, 1, 6)]
+    assert sum(leg["budget"] for leg in legs) == 1000
+
+
+def test_split_days_rejects_empty_city_list():
+    with pytest.raises(ValueError, match="at least one destination"):
+        route_planner.split_days(route_planner.parse_destinations(","), 3, date(2026, 1, 1), 1000)
+
+
+def test_split_days_rejects_too_short_trip():
+    with pytest.raises(ValueError):
+        route_planner.split_days(["A", "B", "C"], 2, date(2026, 1, 1))
+
+
+def test_merge_plans_labels_day_ranges():
+    legs = route_planner.split_days(["A", "B"], 3, date(2026, 1, 1))
+    merged = route_planner.merge_plans(legs, ["plan a", "plan b"])
+    assert "**Route:** A → B" in merged
+    assert "### Days 1-2: A" in merged and "### Day 3: B" in merged
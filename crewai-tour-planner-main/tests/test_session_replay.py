@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("streamlit")
+
+from sample_project import session_replay
+
+
+def replayer_with(delays):
+    replayer = session_replay.Replayer(session_replay.Cassette({}, []))
+    replayer.delays = delays
+    return replayer
+
+
+def test_upstream_time_counts_overlapping_calls_once():
+    replayer = replayer_with([(0.0, 2.0), (1.0, 3.0), (1.5, 2.5), (5.0, 6.0)])
+    assert replayer.upstream_time(0.0, 10.0) == pytest.approx(4.0)
+
+
+def test_upstream_time_is_clipped_to_window():
+    replayer = replayer_with([(0.0, 2.0), (5.0, 6.0)])
+    assert replayer.upstream_time(1.0, 5.5) == pytest.approx(1.5)
+
+
+def test_replay_matches_requests_and_scales_timing():
+    cassette = session_replay.Cassette({}, [
+        {"kind": "http", "key": session_replay._request_key("http", {"url": "u", "params": {"q": "b"}}),
+         "t": 0, "elapsed": 0.05, "request": {}, "response": {"status_code": 200, "body": '"b"'}},
+        {"kind": "http", "key": session_replay._request_key("http", {"url": "u", "params": {"q": "a"}}),
+         "t": 1, "elapsed": 0.05, "request": {}, "response": {"status_code": 200, "body": '"a"'}},
+    ])
+    replayer = session_replay.Replayer(cassette, timing_scale=0.5)
+
+    started = time.perf_counter()
+    # The API key is never part of the match
+    assert replayer.get("u", {"q": "a", "key": "secret"}).json() == "a"
+    assert replayer.get("u", {"q": "b"}).json() == "b"
+    assert replayer.unmatched == 0
+    assert replayer.upstream_time(started, time.perf_counter()) == pytest.approx(0.05, abs=0.02)
+
+
+def test_thread_profiler_sees_script_and_worker_threads(tmp_path):
+    from streamlit.testing.v1 import AppTest
+
+    script = tmp_path / "app.py"
+    script.write_text(
+        "import streamlit as st\n"
+        "from concurrent.futures import ThreadPoolExecutor\n"
+        "def build_prompt_in_script():\n"
+        "    return sum(range(10000))\n"
+        "def parse_in_worker(n):\n"
+        "    return sum(range(10000))\n"
+        "st.write(build_prompt_in_script())\n"
+        "with ThreadPoolExecutor(2) as executor:\n"
+        "    st.write(list(executor.map(parse_in_worker, [1, 2])))\n"
+    )
+    at = AppTest.from_file(str(script)).run()
+    with session_replay.ThreadProfiler() as profiler:
+        at.run()
+
+    report = profiler.report(limit=None)
+    assert "build_prompt_in_script" in report
+    assert "parse_in_worker" in report
+
+
+def test_thread_profiler_can_run_repeatedly_with_concurrent_threads():
+    def work():
+        return sum(range(10000))
+
+    for _ in range(2):
+        with session_replay.ThreadProfiler() as profiler:
+            threads = [threading.Thread(target=work) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert "work" in profiler.report(limit=None)
@@ -0,0 +1,154 @@
+import pytest
+import requests
+
+from sample_project.upstream_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class FlakyError(requests.ConnectionError):
+    pass
+
+
+def client(**kwargs):
+    kwargs.setdefault("backoff_base", 0)
+    return UpstreamClient(**kwargs)
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("sample_project.upstream_client.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    now[0] += 31
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_breaker(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("sample_project.upstream_client.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.open_count == 2
+
+
+def test_call_retries_transient_errors():
+    upstream = client(max_retries=2)
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FlakyError("down")
+        return "ok"
+
+    assert upstream.call("host", fn) == "ok"
+    assert len(attempts) == 3
+    assert upstream.metrics()["counters"]["retries"] == 2
+
+
+def test_call_does_not_retry_non_transient_errors():
+    upstream = client(max_retries=2)
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        raise ValueError("bad credentials")
+
+    with pytest.raises(ValueError):
+        upstream.call("host", fn)
+    assert len(attempts) == 1
+    assert upstream.metrics()["breakers"]["host"]["failures"] == 0
+
+
+def test_breaker_opening_mid_retry_reraises_last_error():
+    upstream = client(max_retries=2, failure_threshold=2)
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        raise FlakyError(f"attempt {len(attempts)}")
+
+    with pytest.raises(FlakyError, match="attempt 2"):
+        upstream.call("host", fn)
+    assert len(attempts) == 2
+    assert upstream.metrics()["counters"]["retries"] == 1
+
+    with pytest.raises(CircuitOpenError):
+        upstream.call("host", fn)
+    assert len(attempts) == 2
+
+
+def test_get_json_serves_stale_then_fallback(monkeypatch):
+    upstream = client(max_retries=0)
+    responses = [{"temp": 20}]
+
+    def get(url, params):
+        if not responses:
+            raise FlakyError("down")
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"temp": 20}'
+        responses.pop()
+        return response
+
+    monkeypatch.setattr(upstream, "_get", get)
+
+    assert upstream.get_json("http://weather/a", {"q": "x"}) == {"temp": 20}
+    assert upstream.get_json("http://weather/a", {"q": "x"}) == {"temp": 20, "degraded": "stale"}
+    assert upstream.get_json("http://weather/a", {"q": "y"}, fallback=lambda: {"temp": 1}) == {"temp": 1, "degraded": "fallback"}
+    counters = upstream.metrics()["counters"]
+    assert (counters["stale"], counters["fallback"]) == (1, 1)
+
+
+def test_get_json_failure_log_omits_api_key(monkeypatch, capsys):
+    upstream = client(max_retries=0)
+
+    def get(url, params):
+        response = requests.Response()
+        response.status_code = 503
+        response.url = url + "?key=SECRETKEY&q=Athens"
+        response.raise_for_status()
+
+    monkeypatch.setattr(upstream, "_get", get)
+    assert upstream.get_json("http://weather/v1/current.json", {"key": "SECRETKEY", "q": "Athens"}) is None
+    out = capsys.readouterr().out
+    assert "SECRETKEY" not in out
+    assert "weather/v1/current.json: HTTPError (HTTP 503)" in out
+
+
+def test_stale_cache_drops_expired_entries_and_is_capped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("sample_project.upstream_client.time.monotonic", lambda: now[0])
+    upstream = client(max_retries=0, stale_ttl=60, max_cached=2)
+    monkeypatch.setattr(upstream, "_get", lambda url, params: _ok_response())
+
+    upstream.get_json("http://weather/a", {"q": "a"})
+    now[0] += 61
+    upstream.get_json("http://weather/a", {"q": "b"})
+    assert upstream.metrics()["cached_entries"] == 1
+
+    upstream.get_json("http://weather/a", {"q": "c"})
+    upstream.get_json("http://weather/a", {"q": "d"})
+    assert upstream.metrics()["cached_entries"] == 2
+
+
+def _ok_response():
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"temp": 20}'
+    return response